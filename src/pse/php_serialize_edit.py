@@ -16,8 +16,11 @@ an error occurs during parsing.
 - PHPSerializer: A class that provides methods to encode Python values into PHP
   serialized format.
 
-- Query: A class that extends the Parser class and provides methods to parse a
-  query string.
+- QueryParser: A class that extends the Parser class and provides methods to
+  parse a query string.
+
+- Query: A class that extends the QueryParser class and provides methods to
+  execute a query on a structure.
 
 The module also includes several constants representing PHP serialized data
 types and separators.
@@ -25,6 +28,8 @@ types and separators.
 Usage:
 
 """
+import functools
+import re
 
 # Constants for serialize/unserialize PHP functions
 # https://www.php.net/manual/fr/function.serialize.php
@@ -41,11 +46,44 @@ PHP_START_ARRAY = b"{"
 PHP_END_ARRAY = b"}"
 PHP_STRING_DELIMITER = b'"'
 
+# Fixed sequences of PHP serialized values, checked in one step
+PHP_STRING_PREFIX = PHP_STRING + PHP_FIELD_SEPARATOR
+PHP_INT_PREFIX = PHP_INT + PHP_FIELD_SEPARATOR
+PHP_BOOL_PREFIX = PHP_BOOL + PHP_FIELD_SEPARATOR
+PHP_DECIMAL_PREFIX = PHP_DECIMAL + PHP_FIELD_SEPARATOR
+PHP_ARRAY_PREFIX = PHP_ARRAY + PHP_FIELD_SEPARATOR
+PHP_OBJECT_PREFIX = PHP_OBJECT + PHP_FIELD_SEPARATOR
+PHP_NULL_VALUE = PHP_NULL + PHP_END_VALUE
+PHP_STRING_OPEN = PHP_FIELD_SEPARATOR + PHP_STRING_DELIMITER
+PHP_STRING_CLOSE = PHP_STRING_DELIMITER + PHP_END_VALUE
+PHP_CLASS_NAME_CLOSE = PHP_STRING_DELIMITER + PHP_FIELD_SEPARATOR
+PHP_ARRAY_OPEN = PHP_FIELD_SEPARATOR + PHP_START_ARRAY
+PHP_ARRAY_CODE = ord(PHP_ARRAY)
+PHP_OBJECT_CODE = ord(PHP_OBJECT)
+
+# Scalars and headers of PHP serialized values, each one decoded by a single
+# match of the regular expression engine
+PHP_STRING_HEADER = re.compile(rb's:([0-9]+):"')
+PHP_INT_VALUE = re.compile(rb'i:(-?[0-9]+);')
+PHP_BOOL_VALUE = re.compile(rb'b:([0-9]+);')
+# Decimals follow PHP: optional sign, digits with an optional dot and exponent,
+# or the special values. INF and NAN are matched in any case because repr()
+# writes them in lower case.
+PHP_DECIMAL_VALUE = re.compile(
+    rb'd:([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?'
+    rb'|(?i:-?inf|nan));'
+)
+PHP_ARRAY_HEADER = re.compile(rb'a:([0-9]+):\{')
+PHP_OBJECT_HEADER = re.compile(rb'O:([0-9]+):"')
+PHP_OBJECT_COUNT = re.compile(rb'":([0-9]+):\{')
+
 # Generic parsing constants
 MINUS = b"-"
 DIGIT_NINE = b"9"
 DIGIT_ZERO = b"0"
-DECIMAL_DOT = b"."
+DIGITS = tuple(
+    bytes((code,)) for code in range(DIGIT_ZERO[0], DIGIT_NINE[0] + 1)
+)
 EMPTY = b""
 
 # Constants for query parsing
@@ -57,6 +95,7 @@ QUERY_PATH_SEPARATOR = b"/"
 QUERY_GET = b"G"
 QUERY_SET = b"S"
 QUERY_DELETE = b"D"
+QUERY_COMMANDS = (QUERY_GET, QUERY_SET, QUERY_DELETE)
 QUERY_COMMAND_SEPARATOR = b":"
 QUERY_START_ARRAY = b"["
 QUERY_END_ARRAY = b"]"
@@ -68,11 +107,43 @@ QUERY_TRUE = b"true"
 QUERY_FALSE = b"false"
 QUERY_NULL = b"null"
 
+# Numbers are scanned by the regular expression engine, whose character classes
+# test each byte against a precomputed table. The integer part may be omitted
+# after a minus sign when a fractional part follows, as in -.5
+QUERY_NUMBER = re.compile(rb"-?(?:[0-9]+|(?=\.[0-9]))(\.[0-9]*)?")
+
+# Number of expressions whose parsed selector is kept
+QUERY_CACHE_SIZE = 256
+
 
 def is_valid_int_start(data: bytes) -> bool:
     """Check if the given byte is a valid start for an integer value."""
     return DIGIT_ZERO <= data <= DIGIT_NINE or data == MINUS
 
+def find_key(structure: list, key) -> int|None:
+    """Return the position of the first (key, value) pair of a PHP array whose
+    key equals the given key, None if there is none."""
+    for position, (item_key, _) in enumerate(structure):
+        if item_key == key:
+            return position
+
+    return None
+
+def find_keys(structure: list, key) -> list:
+    """Return the positions of every (key, value) pair of a PHP array whose key
+    equals the given key."""
+    return [
+        position
+        for position, (item_key, _) in enumerate(structure)
+        if item_key == key
+    ]
+
+def pairs(items: list) -> list:
+    """Group a flat list of keys and values [k1, v1, k2, v2...] into a PHP
+    array [(k1, v1), (k2, v2)...]."""
+    iterator = iter(items)
+    return list(zip(iterator, iterator))
+
 def is_object(data) -> bool:
     """Check if the given data is a PHP object."""
     return (
@@ -82,6 +153,15 @@ def is_object(data) -> bool:
         and isinstance(data[1], list)
     )
 
+def dispatch_table(callbacks: dict) -> list:
+    """Build a table of 256 entries mapping a byte value to its callback, the
+    keys of the given dict being single bytes. Missing entries are None."""
+    table = [None] * 256
+    for key, callback in callbacks.items():
+        table[key[0]] = callback
+
+    return table
+
 class ParseError(Exception):
     """Raised when an error occurs during parsing"""
 
@@ -133,6 +213,10 @@ class Parser:
         read_must(self, expected: bytes) -> bytes: Reads and consumes specific
         bytes from the data stream, raising an exception if the expected bytes
         are not found.
+
+        read_match(self, pattern: re.Pattern, expected: str) -> re.Match:
+        Reads and consumes bytes matching a compiled regular expression,
+        raising an exception if they do not match.
     """
 
     def __init__(self, data: bytes):
@@ -162,8 +246,14 @@ class Parser:
 
     def read_until(self, stop: bytes) -> bytes:
         """Reads bytes from the data stream until the specified stop sequence"""
-        before, _ = self.data[self.current:].split(stop, 1)
-        self.next_byte(len(before))
+        # find() starts at the current position, the tail of the stream is not
+        # copied.
+        stop_position = self.data.find(stop, self.current)
+        if stop_position == -1:
+            raise ParseError(self.current, f"Expected {stop} before the end.")
+
+        before = self.data[self.current:stop_position]
+        self.current = stop_position
         return before
 
     def read_bytes(self, length: bytes = 1) -> bytes:
@@ -174,129 +264,266 @@ class Parser:
 
     def read_must(self, expected: bytes) -> bytes:
         """Consumes specific bytes, raises an exception otherwise"""
-        if len(expected) > (len(self.data) - self.current):
-            raise ParseError(
-                self.current,
-                f"Not enough bytes while expecting {expected}."
-            )
+        # startswith compares in place, no chunk is copied on success.
+        if not self.data.startswith(expected, self.current):
+            if len(expected) > (len(self.data) - self.current):
+                raise ParseError(
+                    self.current,
+                    f"Not enough bytes while expecting {expected}."
+                )
 
-        chunk = self.chunk(len(expected))
-        if chunk != expected:
             raise ParseError(
                 self.current,
-                f"Expected {expected} but {chunk} appeared."
+                f"Expected {expected} but {self.chunk(len(expected))} appeared."
             )
 
         self.next_byte(len(expected))
 
+    def read_match(self, pattern: re.Pattern, expected: str) -> re.Match:
+        """Consumes bytes matching a compiled regular expression and returns
+        the match, raises an exception otherwise"""
+        match = pattern.match(self.data, self.current)
+        if match is None:
+            raise ParseError(self.current, f"Expected {expected}.")
+
+        self.current = match.end()
+        return match
+
 
 class PHPUnserializer(Parser):
     """A class for deserializing PHP serialized data"""
 
-    def __init__(self, data: bytes):
-        self.callbacks = {
-            PHP_STRING: self._string_from_bytes,
-            PHP_INT: self._int_from_bytes,
-            PHP_BOOL: self._bool_from_bytes,
-            PHP_NULL: self._null_from_bytes,
-            PHP_ARRAY: self._array_from_bytes,
-            PHP_DECIMAL: self._decimal_from_bytes,
-            PHP_OBJECT: self._object_from_bytes,
-        }
-
-        super().__init__(data)
-
     def _string_from_bytes(self) -> bytes:
         """Decode a PHP_ string"""
-        self.read_must(PHP_STRING)
-        self.read_must(PHP_FIELD_SEPARATOR)
-        size = int(self.read_until(PHP_FIELD_SEPARATOR))
-        self.read_must(PHP_FIELD_SEPARATOR)
-        self.read_must(PHP_STRING_DELIMITER)
+        size = int(self.read_match(PHP_STRING_HEADER, "a string")[1])
         value = self.read_bytes(size)
-        self.read_must(PHP_STRING_DELIMITER)
-        self.read_must(PHP_END_VALUE)
+        self.read_must(PHP_STRING_CLOSE)
 
         return value
 
     def _int_from_bytes(self) -> int:
         """Decode a PHP_ integer"""
-        self.read_must(PHP_INT)
-        self.read_must(PHP_FIELD_SEPARATOR)
-        value = int(self.read_until(PHP_END_VALUE))
-        self.read_must(PHP_END_VALUE)
-
-        return value
+        return int(self.read_match(PHP_INT_VALUE, "an integer")[1])
 
     def _decimal_from_bytes(self) -> float:
         """Decode a PHP_ decimal"""
-        self.read_must(PHP_DECIMAL)
-        self.read_must(PHP_FIELD_SEPARATOR)
-        value = float(self.read_until(PHP_END_VALUE))
-        self.read_must(PHP_END_VALUE)
-
-        return value
+        return float(self.read_match(PHP_DECIMAL_VALUE, "a decimal")[1])
 
     def _bool_from_bytes(self) -> bool:
         """Decode a PHP_ boolean"""
-        self.read_must(PHP_BOOL)
-        self.read_must(PHP_FIELD_SEPARATOR)
-        value = bool(int(self.read_until(PHP_END_VALUE)))
-        self.read_must(PHP_END_VALUE)
-
-        return value
+        return bool(int(self.read_match(PHP_BOOL_VALUE, "a boolean")[1]))
 
     def _null_from_bytes(self) -> None:
         """Decode a PHP_ null value"""
-        self.read_must(PHP_NULL)
-        self.read_must(PHP_END_VALUE)
-
-    def _array_from_bytes(self) -> list:
-        """Decode a PHP_ array"""
-        self.read_must(PHP_ARRAY)
-        self.read_must(PHP_FIELD_SEPARATOR)
-        size = int(self.read_until(PHP_FIELD_SEPARATOR))
-        self.read_must(PHP_FIELD_SEPARATOR)
-        self.read_must(PHP_START_ARRAY)
-
-        array = [(self.from_bytes(), self.from_bytes()) for _ in range(size)]
-
-        self.read_must(PHP_END_ARRAY)
-
-        return array
-
-    def _object_from_bytes(self) -> tuple[bytes, list]:
-        """Decode a PHP object"""
-        self.read_must(PHP_OBJECT)
-        self.read_must(PHP_FIELD_SEPARATOR)
-
-        size = int(self.read_until(PHP_FIELD_SEPARATOR))
-        self.read_must(PHP_FIELD_SEPARATOR)
-        self.read_must(PHP_STRING_DELIMITER)
+        self.read_must(PHP_NULL_VALUE)
+
+    # Indexed by the byte value of the PHP type, arrays and objects are handled
+    # by from_bytes. Built once for the class from the plain functions, which
+    # are then called with the instance.
+    callbacks = dispatch_table({
+        PHP_STRING: _string_from_bytes,
+        PHP_INT: _int_from_bytes,
+        PHP_BOOL: _bool_from_bytes,
+        PHP_NULL: _null_from_bytes,
+        PHP_DECIMAL: _decimal_from_bytes,
+    })
+
+    def _array_start_from_bytes(self) -> tuple[None, int]:
+        """Decode the header of a PHP_ array, returns no class name and the
+        number of elements"""
+        return (None, int(self.read_match(PHP_ARRAY_HEADER, "an array")[1]))
+
+    def _object_start_from_bytes(self) -> tuple[bytes, int]:
+        """Decode the header of a PHP object, returns the class name and the
+        number of properties"""
+        size = int(self.read_match(PHP_OBJECT_HEADER, "an object")[1])
         class_name = self.read_bytes(size)
-        self.read_must(PHP_STRING_DELIMITER)
-        self.read_must(PHP_FIELD_SEPARATOR)
-
-        count = int(self.read_until(PHP_FIELD_SEPARATOR))
-        self.read_must(PHP_FIELD_SEPARATOR)
-        self.read_must(PHP_START_ARRAY)
+        count = int(self.read_match(PHP_OBJECT_COUNT, "a property count")[1])
 
-        props = [(self.from_bytes(), self.from_bytes()) for _ in range(count)]
+        return (class_name, count)
 
+    def _end_from_bytes(self, class_name: bytes|None, items: list):
+        """Decode the end of a PHP_ array or object given its keys and values"""
         self.read_must(PHP_END_ARRAY)
 
-        return (class_name, props)
+        array = pairs(items)
+        if class_name is None:
+            return array
+
+        return (class_name, array)
 
     def from_bytes(self) -> int|float|list|tuple[bytes, list]|bool|None:
         """Decode a PHP_ serialized value from a bytes object"""
-        php_type = self.chunk()
-        if php_type not in self.callbacks:
-            raise ParseError(
-                self.current,
-                f"Unknown PHP_ object type '{php_type}'"
-            )
+        # Arrays and objects are decoded with an explicit stack instead of
+        # recursive calls, so the nesting depth is not bounded by the Python
+        # recursion limit. A frame holds the class name (None for an array),
+        # the number of keys and values expected and those decoded so far.
+        stack = []
+        while True:
+            if self.end_of_data():
+                raise ParseError(self.current, "Unexpected end of data")
+
+            php_type = self.data[self.current]
+            if php_type == PHP_ARRAY_CODE or php_type == PHP_OBJECT_CODE:
+                if php_type == PHP_ARRAY_CODE:
+                    class_name, count = self._array_start_from_bytes()
+                else:
+                    class_name, count = self._object_start_from_bytes()
 
-        return self.callbacks[php_type]()
+                if count > 0:
+                    stack.append((class_name, 2 * count, []))
+                    continue
+
+                value = self._end_from_bytes(class_name, [])
+            else:
+                callback = self.callbacks[php_type]
+                if callback is None:
+                    raise ParseError(
+                        self.current,
+                        f"Unknown PHP_ object type '{self.chunk()}'"
+                    )
+
+                value = callback(self)
+
+            # Give the value to the innermost container, closing the ones
+            # which are complete.
+            while stack:
+                class_name, size, items = stack[-1]
+                items.append(value)
+                if len(items) < size:
+                    break
+
+                stack.pop()
+                value = self._end_from_bytes(class_name, items)
+
+            if not stack:
+                return value
+
+
+# Decimal forms of small integers, which make most of the lengths, counts and
+# array indexes found in PHP serialized data
+SMALL_INT_COUNT = 1024
+_SMALL_INTS = [b"%d" % number for number in range(SMALL_INT_COUNT)]
+_SMALL_INT_VALUES = [
+    PHP_INT_PREFIX + digits + PHP_END_VALUE for digits in _SMALL_INTS
+]
+_BOOL_VALUES = (
+    PHP_BOOL_PREFIX + _SMALL_INTS[0] + PHP_END_VALUE,
+    PHP_BOOL_PREFIX + _SMALL_INTS[1] + PHP_END_VALUE,
+)
+
+# Complete headers of short strings and small arrays, appended in one go
+_STRING_HEADERS = [
+    PHP_STRING_PREFIX + digits + PHP_STRING_OPEN for digits in _SMALL_INTS
+]
+_ARRAY_HEADERS = [
+    PHP_ARRAY_PREFIX + digits + PHP_ARRAY_OPEN for digits in _SMALL_INTS
+]
+
+def _write_string(out: bytearray, value: bytes) -> None:
+    size = len(value)
+    if size < SMALL_INT_COUNT:
+        out += _STRING_HEADERS[size]
+    else:
+        out += PHP_STRING_PREFIX
+        out += b"%d" % size
+        out += PHP_STRING_OPEN
+
+    out += value
+    out += PHP_STRING_CLOSE
+
+def _write_bool(out: bytearray, value: bool) -> None:
+    out += _BOOL_VALUES[value]
+
+def _write_int(out: bytearray, value: int) -> None:
+    if 0 <= value < SMALL_INT_COUNT:
+        out += _SMALL_INT_VALUES[value]
+        return
+
+    out += PHP_INT_PREFIX
+    out += b"%d" % value
+    out += PHP_END_VALUE
+
+def _write_float(out: bytearray, value: float) -> None:
+    out += PHP_DECIMAL_PREFIX
+    # repr() gives the shortest decimal string that round-trips the float.
+    out += b"%r" % value
+    out += PHP_END_VALUE
+
+def _write_null(out: bytearray, _value: None) -> None:
+    out += PHP_NULL_VALUE
+
+def _write_array(out: bytearray, value: list) -> None:
+    count = len(value)
+    if count < SMALL_INT_COUNT:
+        out += _ARRAY_HEADERS[count]
+    else:
+        out += PHP_ARRAY_PREFIX
+        out += b"%d" % count
+        out += PHP_ARRAY_OPEN
+
+    for key, item in value:
+        # Keys are nearly always small indexes or strings, these skip the
+        # generic dispatch.
+        key_type = type(key)
+        if key_type is int and 0 <= key < SMALL_INT_COUNT:
+            out += _SMALL_INT_VALUES[key]
+        elif key_type is bytes:
+            _write_string(out, key)
+        else:
+            _write(out, key)
+
+        _write(out, item)
+
+    out += PHP_END_ARRAY
+
+def _write_object(out: bytearray, value: tuple[bytes, list]) -> None:
+    if not is_object(value):
+        raise SerializeError(f"Cannot encode {value}")
+
+    class_name, properties = value
+    size = len(class_name)
+    count = len(properties)
+    out += PHP_OBJECT_PREFIX
+    out += _SMALL_INTS[size] if size < SMALL_INT_COUNT else b"%d" % size
+    out += PHP_STRING_OPEN
+    out += class_name
+    out += PHP_CLASS_NAME_CLOSE
+    out += _SMALL_INTS[count] if count < SMALL_INT_COUNT else b"%d" % count
+    out += PHP_ARRAY_OPEN
+    for property_name, property_value in properties:
+        _write(out, property_name)
+        _write(out, property_value)
+
+    out += PHP_END_ARRAY
+
+_WRITERS = {
+    bytes: _write_string,
+    bool: _write_bool,
+    int: _write_int,
+    float: _write_float,
+    type(None): _write_null,
+    list: _write_array,
+    tuple: _write_object,
+}
+
+def _write(out: bytearray, value) -> None:
+    """Appends the PHP serialized form of value to out. Nested values are
+    written to the same buffer instead of being serialized separately and
+    joined."""
+    writer = _WRITERS.get(type(value))
+    if writer is None:
+        raise SerializeError(f"Cannot encode {value}")
+
+    writer(out, value)
+
+
+def _serialize(value) -> bytes:
+    """Serializes value into a fresh buffer, without going through a
+    PHPSerializer instance."""
+    out = bytearray()
+    _write(out, value)
+    return bytes(out)
 
 
 class PHPSerializer:
@@ -305,12 +532,12 @@ class PHPSerializer:
 
     This class provides methods to convert various Python data types into their
     corresponding PHP serialized format. It supports strings, booleans,
-    integers, floats, and arrays.
+    integers, floats, null, arrays and objects.
 
     Usage:
-        serializer = PHPSerializer()
+        serializer = PHPSerializer(data)
 
-        serialized_data = serializer.to_bytes(data)
+        serialized_data = serializer.to_bytes()
 
     Note:
         - The serialized data is returned as bytes.
@@ -321,166 +548,68 @@ class PHPSerializer:
     def __init__(self, data):
         self.reset(data)
 
-        self.callbacks = {
-            bytes: self._string_to_bytes,
-            bool: self._bool_to_bytes,
-            int: self._int_to_bytes,
-            float: self._float_to_bytes,
-            list: self._array_to_bytes,
-        }
-
     def reset(self, data):
         """Reset the serializer with new data"""
         self.data = data
 
-    def _string_to_bytes(self) -> bytes:
-        return (
-            PHP_STRING
-            + PHP_FIELD_SEPARATOR
-            + bytes(str(len(self.data)), "utf-8")
-            + PHP_FIELD_SEPARATOR
-            + PHP_STRING_DELIMITER
-            + self.data
-            + PHP_STRING_DELIMITER
-            + PHP_END_VALUE
-        )
-
-    def _bool_to_bytes(self) -> bytes:
-        return (
-            PHP_BOOL + PHP_FIELD_SEPARATOR +
-            bytes(str(int(self.data)), "utf-8") + PHP_END_VALUE
-        )
-
-    def _int_to_bytes(self) -> bytes:
-        return (
-            PHP_INT + PHP_FIELD_SEPARATOR +
-            bytes(str(self.data), "utf-8") + PHP_END_VALUE
-        )
-
-    def _float_to_bytes(self) -> bytes:
-        return (
-            PHP_DECIMAL + PHP_FIELD_SEPARATOR +
-            bytes(str(self.data), "utf-8") + PHP_END_VALUE
-        )
-
-    def _array_to_bytes(self) -> bytes:
-        return (
-            PHP_ARRAY
-            + PHP_FIELD_SEPARATOR
-            + bytes(str(len(self.data)), "utf-8")
-            + PHP_FIELD_SEPARATOR
-            + PHP_START_ARRAY
-            + EMPTY.join([
-                PHPSerializer(key).to_bytes() +
-                PHPSerializer(value).to_bytes() for (key, value) in self.data
-            ])
-            + PHP_END_ARRAY
-        )
-
-    def _object_to_bytes(self) -> bytes:
-        class_name, properties = self.data
-        return (
-            PHP_OBJECT
-            + PHP_FIELD_SEPARATOR
-            + bytes(str(len(class_name)), "utf-8")
-            + PHP_FIELD_SEPARATOR
-            + PHP_STRING_DELIMITER
-            + class_name
-            + PHP_STRING_DELIMITER
-            + PHP_FIELD_SEPARATOR
-            + bytes(str(len(properties)), "utf-8")
-            + PHP_FIELD_SEPARATOR
-            + PHP_START_ARRAY
-            + EMPTY.join([
-                PHPSerializer(property_name).to_bytes() +
-                PHPSerializer(property_value).to_bytes()
-                for (property_name, property_value) in properties
-            ])
-            + PHP_END_ARRAY
-        )
-
     def to_bytes(self) -> bytes:
         """Converts the given Python object into PHP serialized format."""
-        if type(self.data) in self.callbacks:
-            return self.callbacks[type(self.data)]()
-
-        if is_object(self.data):
-            return self._object_to_bytes()
-
-        raise SerializeError(f"Cannot encode {self.data}")
+        return _serialize(self.data)
 
 
-class Query(Parser):
-    """A Query is a class that extends the Parser class and provides methods to
-    parse a query string and execute an expression."""
-
-    def __init__(self, structure):
-        super().__init__(EMPTY)
-        self.structure = structure
-
-        self.callbacks = {
-            QUERY_START_STRING: self._parse_string,
-            QUERY_START_ARRAY: self._parse_array,
-            QUERY_START_OBJECT: self._parse_object,
-            QUERY_TRUE[0:1]: self._parse_true,
-            QUERY_FALSE[0:1]: self._parse_false,
-            QUERY_NULL[0:1]: self._parse_null,
-        }
-
+class QueryParser(Parser):
+    """A QueryParser is a class that extends the Parser class and provides
+    methods to parse a query string."""
 
     def _parse_string(self) -> bytes:
         self.read_must(QUERY_START_STRING)
 
-        escaping = False
-        string = EMPTY
-        while not self.end_of_data():
-            if escaping:
-                escaping = False
-                string += self.read_bytes()
-            elif self.chunk() == QUERY_ESCAPE:
-                escaping = True
-                self.next_byte()
-            elif self.chunk() == QUERY_END_STRING:
-                self.read_must(QUERY_END_STRING)
-                return string
-            else:
-                string += self.read_bytes()
-
-        if escaping:
-            raise ParseError(self.current, "Incomplete escape sequence")
-
-        raise ParseError(self.current, "Unterminated string")
+        # Unescaped runs are located with find() and sliced in one go, a buffer
+        # is only needed once an escape sequence has been met.
+        data = self.data
+        end = len(data)
+        start = self.current
+        string = None
+        end_string = -1
+        while True:
+            # The closing quote is searched again only when the previous one
+            # turned out to be escaped.
+            if end_string < start:
+                end_string = data.find(QUERY_END_STRING, start)
+
+            escape = data.find(
+                QUERY_ESCAPE, start, end if end_string == -1 else end_string
+            )
 
+            if escape == -1:
+                if end_string == -1:
+                    self.current = end
+                    raise ParseError(end, "Unterminated string")
 
-    def _parse_number(self) -> int|float:
-        number_string = EMPTY
-        if self.chunk() == MINUS:
-            number_string = MINUS
-            self.next_byte()
+                self.current = end_string + 1
+                if string is None:
+                    return data[start:end_string]
 
-        while not self.end_of_data():
-            if not DIGIT_ZERO <= self.chunk() <= DIGIT_NINE:
-                break
+                string += data[start:end_string]
+                return bytes(string)
 
-            number_string += self.chunk()
-            self.next_byte()
+            if escape + 1 == end:
+                self.current = end
+                raise ParseError(end, "Incomplete escape sequence")
 
-        if number_string == EMPTY:
-            raise ParseError(self.current, "Expected a digit")
+            if string is None:
+                string = bytearray()
 
-        if self.chunk() != DECIMAL_DOT:
-            return int(number_string)
+            string += data[start:escape]
+            string.append(data[escape + 1])
+            start = escape + 2
 
-        self.next_byte()
-        number_string += DECIMAL_DOT
-        while not self.end_of_data():
-            if not DIGIT_ZERO <= self.chunk() <= DIGIT_NINE:
-                break
-
-            number_string += self.chunk()
-            self.next_byte()
+    def _parse_number(self) -> int|float:
+        number = self.read_match(QUERY_NUMBER, "a number")
+        if number[1] is None:
+            return int(number[0])
 
-        return float(number_string)
+        return float(number[0])
 
     def _parse_selector(self) -> list:
         require_selector = True
@@ -518,40 +647,34 @@ class Query(Parser):
 
         return selector
 
-    def _parse_array(self) -> list:
-        self.read_must(QUERY_START_ARRAY)
+    def _parse_container_start(self) -> bytes|None:
+        """Parse the start of an array or an object, returns the class name of
+        the object or None for an array"""
+        class_name = None
+        if self.chunk() == QUERY_START_OBJECT:
+            self.read_must(QUERY_START_OBJECT)
 
-        array = []
-        while not self.end_of_data() and self.chunk() != QUERY_END_ARRAY:
-            key = self._parse_value()
-            self.read_must(QUERY_KEY_VALUE_SEPARATOR)
-            value = self._parse_value()
-            array.append((key, value))
-
-            if self.chunk() == QUERY_ITEM_SEPARATOR:
-                self.read_must(QUERY_ITEM_SEPARATOR)
-                continue
+            class_name = self._parse_string()
+            if len(class_name) == 0:
+                raise ParseError(self.current, "Class name can not be empty")
 
-            if self.chunk() != QUERY_END_ARRAY:
-                raise ParseError(self.current, "Unexpected char in array")
-
-        self.read_must(QUERY_END_ARRAY)
+            self.read_must(QUERY_ITEM_SEPARATOR)
 
-        return array
+        self.read_must(QUERY_START_ARRAY)
 
-    def _parse_object(self) -> tuple[bytes, list]:
-        self.read_must(QUERY_START_OBJECT)
+        return class_name
 
-        class_name = self._parse_string()
-        if len(class_name) == 0:
-            raise ParseError(self.current, "Class name can not be empty")
+    def _parse_container_end(self, class_name: bytes|None, items: list):
+        """Parse the end of an array or an object given its keys and values"""
+        self.read_must(QUERY_END_ARRAY)
 
-        self.read_must(QUERY_ITEM_SEPARATOR)
-        properties = self._parse_array()
+        array = pairs(items)
+        if class_name is None:
+            return array
 
         self.read_must(QUERY_END_OBJECT)
 
-        return (class_name, properties)
+        return (class_name, array)
 
     def _parse_true(self) -> bool:
         self.read_must(QUERY_TRUE)
@@ -564,28 +687,95 @@ class Query(Parser):
     def _parse_null(self) -> None:
         self.read_must(QUERY_NULL)
 
+    # Indexed by the byte value starting the value, arrays and objects are
+    # handled by _parse_value. Built once for the class from the plain
+    # functions, which are then called with the instance.
+    callbacks = dispatch_table({
+        QUERY_START_STRING: _parse_string,
+        QUERY_TRUE[0:1]: _parse_true,
+        QUERY_FALSE[0:1]: _parse_false,
+        QUERY_NULL[0:1]: _parse_null,
+        MINUS: _parse_number,
+        **dict.fromkeys(DIGITS, _parse_number),
+    })
+
+    def _parse_scalar(self) -> int|float|bytes|bool|None:
+        """Parse a value which is neither an array nor an object"""
+        if self.end_of_data():
+            raise ParseError(self.current, "Expected a value")
+
+        callback = self.callbacks[self.data[self.current]]
+        if callback is None:
+            raise ParseError(self.current, "Expected a value")
+
+        return callback(self)
+
     def _parse_value(self) -> int|float|list|tuple[bytes, list]|bool|None:
         """Parse a value from the query string"""
-        chunk = self.chunk()
-        if chunk in self.callbacks:
-            return self.callbacks[chunk]()
-
-        if is_valid_int_start(chunk):
-            return self._parse_number()
-
-        raise ParseError(self.current, "Expected a value")
+        # Arrays and objects are parsed with an explicit stack instead of
+        # recursive calls, so the nesting depth is not bounded by the Python
+        # recursion limit. A frame holds the class name (None for an array)
+        # and the keys and values parsed so far.
+        stack = []
+        while True:
+            opening = self.chunk()
+            if opening == QUERY_START_ARRAY or opening == QUERY_START_OBJECT:
+                class_name = self._parse_container_start()
+                if self.chunk() != QUERY_END_ARRAY:
+                    stack.append((class_name, []))
+                    continue
 
-    def _parse_command(self) -> tuple[bytes, list, int|float|bytes|tuple|list]:
-        """Parse a command from the query string"""
+                value = self._parse_container_end(class_name, [])
+            else:
+                value = self._parse_scalar()
+
+            # Give the value to the innermost container, closing the ones
+            # which are complete.
+            while stack:
+                class_name, items = stack[-1]
+                items.append(value)
+                if len(items) % 2 == 1:
+                    self.read_must(QUERY_KEY_VALUE_SEPARATOR)
+                    break
+
+                if self.chunk() == QUERY_ITEM_SEPARATOR:
+                    self.read_must(QUERY_ITEM_SEPARATOR)
+                    if self.chunk() != QUERY_END_ARRAY:
+                        break
+                elif self.chunk() != QUERY_END_ARRAY:
+                    raise ParseError(self.current, "Unexpected char in array")
+
+                stack.pop()
+                value = self._parse_container_end(class_name, items)
+
+            if not stack:
+                return value
+
+    def _parse_head(self) -> tuple[bytes, tuple, int]:
+        """Parse the command and the selector of the expression, returns them
+        with the position following the selector."""
         command_id = self.chunk()
 
-        if command_id not in [QUERY_GET, QUERY_SET, QUERY_DELETE]:
+        if command_id not in QUERY_COMMANDS:
             raise ParseError(self.current, f"Unknown command '{command_id}'.")
 
         self.read_must(command_id)
         self.read_must(QUERY_COMMAND_SEPARATOR)
-        selector = self._parse_selector()
+        selector = tuple(self._parse_selector())
+
+        return (command_id, selector, self.current)
 
+    def _parse_command(self) -> tuple[bytes, tuple, int|float|bytes|tuple|list]:
+        """Parse a command from the query string"""
+        # S expressions end with a value which usually changes from one run
+        # to the next, caching them would only fill the cache.
+        if self.data.startswith(QUERY_SET):
+            command_id, selector, _ = self._parse_head()
+        else:
+            command_id, selector, self.current = _parse_cached_head(self.data)
+
+        # The value is parsed on each run: it ends up in the structure and
+        # must not be shared between results.
         if command_id == QUERY_SET:
             self.read_must(QUERY_EQUAL)
             value = self._parse_value()
@@ -595,78 +785,145 @@ class Query(Parser):
         return (command_id, selector, value)
 
 
-    def _set(self, selector: list, value, structure):
-        """Set a value in the structure"""
-        if selector == []:
-            return value
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _parse_cached_head(expression: bytes) -> tuple[bytes, tuple, int]:
+    """Parse the command and the selector of a G or D expression. Results are
+    cached so that an expression run repeatedly has its selector parsed only
+    once."""
+    return QueryParser(expression)._parse_head()
+
+
+class Query(QueryParser):
+    """A Query is a class that extends the QueryParser class and provides
+    methods to execute an expression on a structure."""
+
+    def __init__(self, structure):
+        super().__init__(EMPTY)
+        self.structure = structure
+
+    def _rebuild(self, levels: list, values: list):
+        """Rebuild the containers met along a selector path, from the innermost
+        ones which receive the values, up to the root. Each level holds one
+        (class_name, container, positions, key) frame per container reached,
+        values holds the new values for the pairs selected by the deepest
+        level, in order. Siblings are shared with the original structure, only
+        the containers on the path are copied."""
+        for frames in reversed(levels):
+            values = iter(values)
+            rebuilt = []
+            for class_name, container, positions, key in frames:
+                container = list(container)
+                if positions is None:
+                    container.append((key, next(values)))
+                else:
+                    for position in positions:
+                        container[position] = (
+                            container[position][0], next(values)
+                        )
 
-        if isinstance(structure, list):
-            key = selector[0]
-            modified_data = []
-            value_must_be_created = True
-            for item_key, item_value in structure:
-                if key == item_key:
-                    item_value = self._set(selector[1:], value, item_value)
-                    value_must_be_created = False
+                rebuilt.append(
+                    container if class_name is None else (class_name, container)
+                )
 
-                modified_data.append((item_key, item_value))
+            values = rebuilt
 
-            if value_must_be_created:
-                modified_data.append((key, self._set(selector[1:], value, [])))
+        return values[0]
 
-            return modified_data
+    @staticmethod
+    def _unwrap(node, error: str) -> tuple[bytes|None, list]:
+        """Split a PHP object into its class name and its properties, an array
+        is returned with no class name. Raises ValueError for other values."""
+        class_name = None
+        if is_object(node):
+            class_name, node = node
 
-        if is_object(structure):
-            return (structure[0], self._set(selector, value, structure[1]))
+        if not isinstance(node, list):
+            raise ValueError(error)
 
-        raise ValueError("Expected list of object")
+        return (class_name, node)
+
+    def _walk_level(self, nodes: list, key, create_missing: bool, error: str):
+        """Follow one selector key from every container of a level, returns the
+        (class_name, container, positions, key) frames expected by _rebuild and
+        the values found. Every pair matching the key is followed, a missing
+        key yields an empty array to fill when create_missing is set."""
+        frames = []
+        children = []
+        for node in nodes:
+            class_name, node = self._unwrap(node, error)
+
+            positions = find_keys(node, key)
+            if positions:
+                children.extend(node[position][1] for position in positions)
+            elif create_missing:
+                positions = None
+                children.append([])
+
+            frames.append((class_name, node, positions, key))
+
+        return (frames, children)
+
+    def _set(self, selector: list, value, structure):
+        """Set a value in the structure"""
+        levels = []
+        nodes = [structure]
+        for key in selector:
+            frames, nodes = self._walk_level(
+                nodes, key, True, "Expected list of object"
+            )
+            levels.append(frames)
+
+        return self._rebuild(levels, [value] * len(nodes))
 
     def _get(self, selector, structure):
         """Get a value from the structure"""
-        if selector == []:
-            return structure
+        for key in selector:
+            if is_object(structure):
+                structure = structure[1]
 
-        if isinstance(structure, list):
-            to_get = selector[0]
+            if not isinstance(structure, list):
+                return None
 
-            for key, value in structure:
-                if key == to_get:
-                    return self._get(selector[1:], value)
+            position = find_key(structure, key)
+            if position is None:
+                return None
 
-        if is_object(structure):
-            return self._get(selector, structure[1])
+            structure = structure[position][1]
 
-        return None
+        return structure
 
     def _delete(self, selector, structure):
         """Delete a value from the structure"""
-        if selector == []:
+        if not selector:
             return structure
 
-        if isinstance(structure, list):
-            to_delete = selector[0]
-            if len(selector) == 1:
-                return [
-                    (key, value) for key, value in structure if key != to_delete
-                ]
-
-            modified = []
-            for key, value in structure:
-                if key == to_delete:
-                    modified.append((key, self._delete(selector[1:], value)))
-                else:
-                    modified.append((key, value))
+        error = "Expected a list or an object"
+        levels = []
+        nodes = [structure]
+        for key in selector[:-1]:
+            frames, nodes = self._walk_level(nodes, key, False, error)
+            if not nodes:
+                return structure
+
+            levels.append(frames)
 
-            return modified
+        to_delete = selector[-1]
+        remainings = []
+        for node in nodes:
+            class_name, node = self._unwrap(node, error)
+            remaining = [item for item in node if item[0] != to_delete]
+            if class_name is not None:
+                remaining = (class_name, remaining)
 
-        if is_object(structure):
-            return (structure[0], self._delete(selector, structure[1]))
+            remainings.append(remaining)
 
-        raise ValueError("Expected a list or an object")
+        return self._rebuild(levels, remainings)
 
     def run(self, expression: bytes):
         """Run the query on the structure"""
-        self.reset(expression)
+        # Parsed values slice the expression, they must be bytes and not
+        # bytearray. bytes() returns a bytes argument as is.
+        self.reset(bytes(expression))
         (command, selector, value) = self._parse_command()
 
         if command == QUERY_SET:
@@ -693,7 +950,7 @@ def php_serialize(value) -> bytes:
         bytes: The PHP serialized string.
 
     """
-    return PHPSerializer(value).to_bytes()
+    return _serialize(value)
 
 
 def php_unserialize(data: bytes):
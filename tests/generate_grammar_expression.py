@@ -138,16 +138,11 @@ def main():
         except RecursionError:
             pass
 
-    print('    @parameterized.expand([')
+    print('VALID_EXPRESSIONS: tuple[bytes, ...] = (')
     for example in examples:
-        print(f'        ["valid", {example}],')
+        print(f'    {example},')
 
-    print('    ])')
-    print('    def test_valid(self, _name, expression):')
-    print('        try:')
-    print('            Query([]).run(expression)')
-    print('        except ParseError as e:')
-    print("            raise AssertionError(f'Error on {expression}: {e}')")
+    print(')')
 
     examples = set()
     VALID = False
@@ -158,14 +153,11 @@ def main():
         except RecursionError:
             pass
 
-    print('    @parameterized.expand([')
+    print('INVALID_EXPRESSIONS: tuple[bytes, ...] = (')
     for example in examples:
-        print(f'        ["invalid", {example}],')
+        print(f'    {example},')
 
-    print('    ])')
-    print('    def test_invalid(self, _name, expression):')
-    print('        with self.assertRaises(ParseError):')
-    print('            Query([]).run(expression)')
+    print(')')
 
 
 if __name__ == '__main__':
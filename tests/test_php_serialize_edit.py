@@ -1,348 +1,510 @@
+from functools import lru_cache
+from itertools import groupby
 from unittest import TestCase, main
-from parameterized import parameterized
 from pse.php_serialize_edit import (
-    php_serialize, php_unserialize, Query, php_modify, ParseError
+    php_serialize, php_unserialize, Query, php_modify, ParseError,
+    SerializeError, Parser
 )
 
 
+# Query.run never mutates its structure in place, so every expression test
+# can start from the same empty array.
+_EMPTY_INITIAL = []
+
+# Number of test methods the generated expression tables are split into.
+SHARD_COUNT = 4
+
+
+def setUpModule():
+    # Run one trivial query before any test so the first timed test does not
+    # pay for first-use work in Query.
+    Query(_EMPTY_INITIAL).run(b"G:")
+
+
+@lru_cache(maxsize=None)
+def _cached_unserialize(serialized: bytes):
+    """php_unserialize shared by the tests that parse the same strings. The
+    results are only compared or serialized, never mutated."""
+    return php_unserialize(serialized)
+
+
+# Fixtures shared by several tables. Neither php_serialize nor Query.run
+# mutates its input, so the same objects can be reused across rows.
+_PAIR_01 = [(0, 0), (1, 1)]
+_PERSON = (b"Person", [(b"name", b"Jane"), (b"age", 25)])
+_PERSON_SERIALIZED = b'O:6:"Person":2:{s:4:"name";s:4:"Jane";s:3:"age";i:25;}'
+
+
+UNSERIALIZE_CASES = (
+    [b"i:124;", 124],
+    [b"i:-124;", -124],
+    [b"d:124.56;", 124.56],
+    [b"d:1.0E+25;", 1e25],
+    [b"d:-INF;", float("-inf")],
+    [b"b:0;", False],
+    [b"b:1;", True],
+    [b"a:2:{i:0;i:0;i:1;i:1;}", _PAIR_01],
+    [b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}',
+        [(0, [(b"a", True), (b"b", False)]), (1, 0), (2, 1)]],
+    [b'a:53:{s:5:"debug";b:0;s:19:"enabled_css_preload";b:0;s:18:"enabled_js_preload";b:0;s:11:"hpreconnect";s:0:"";s:8:"hpreload";s:0:"";s:7:"loadcss";b:0;s:10:"remove_css";b:0;s:17:"critical_path_css";s:0:"";s:31:"critical_path_css_is_front_page";s:0:"";s:30:"preserve_settings_on_uninstall";b:1;s:22:"disable_when_logged_in";b:0;s:16:"default_protocol";s:7:"dynamic";s:17:"html_minification";b:1;s:16:"clean_header_one";b:0;s:13:"emoji_removal";b:1;s:18:"merge_google_fonts";b:1;s:19:"enable_display_swap";b:1;s:18:"remove_googlefonts";b:0;s:13:"gfonts_method";s:7:"inherit";s:15:"fawesome_method";s:7:"inherit";s:10:"enable_css";b:1;s:23:"enable_css_minification";b:1;s:21:"enable_merging_of_css";b:1;s:23:"remove_print_mediatypes";b:0;s:10:"inline_css";b:0;s:9:"enable_js";b:1;s:22:"enable_js_minification";b:1;s:20:"enable_merging_of_js";b:1;s:15:"enable_defer_js";s:10:"individual";s:13:"defer_js_type";s:5:"defer";s:12:"defer_jquery";b:1;s:18:"enable_js_trycatch";b:0;s:19:"exclude_defer_login";b:1;s:7:"cdn_url";s:0:"";s:9:"cdn_force";b:0;s:9:"async_css";s:0:"";s:8:"async_js";s:0:"";s:24:"disable_css_inline_merge";b:1;s:6:"ualist";a:8:{i:0;s:12:"x11.*fox\\/54";i:1;s:20:"oid\\s4.*xus.*ome\\/62";i:2;s:12:"x11.*ome\\/62";i:3;s:5:"oobot";i:4;s:5:"ighth";i:5;s:5:"tmetr";i:6;s:6:"eadles";i:7;s:5:"ingdo";}s:32:"exclude_js_from_page_speed_tools";b:0;s:33:"exclude_css_from_page_speed_tools";b:0;s:9:"blacklist";a:0:{}s:11:"ignore_list";a:0:{}s:10:"exclude_js";s:0:"";s:11:"exclude_css";s:0:"";s:23:"edit_default_exclutions";b:0;s:18:"merge_allowed_urls";s:0:"";s:7:"enabled";b:1;s:17:"last-cache-update";i:1706195082;s:14:"plugin_version";s:5:"0.0.0";s:14:"cache_lifespan";i:30;s:25:"merge_inline_extra_css_js";b:1;s:19:"include_ui_elements";b:1;}',
+     [(b'debug', False),
+      (b'enabled_css_preload', False),
+         (b'enabled_js_preload', False),
+         (b'hpreconnect', b''),
+         (b'hpreload', b''),
+         (b'loadcss', False),
+         (b'remove_css', False),
+         (b'critical_path_css', b''),
+         (b'critical_path_css_is_front_page', b''),
+         (b'preserve_settings_on_uninstall', True),
+         (b'disable_when_logged_in', False),
+         (b'default_protocol', b'dynamic'),
+         (b'html_minification', True),
+         (b'clean_header_one', False),
+         (b'emoji_removal', True),
+         (b'merge_google_fonts', True),
+         (b'enable_display_swap', True),
+         (b'remove_googlefonts', False),
+         (b'gfonts_method', b'inherit'),
+         (b'fawesome_method', b'inherit'),
+         (b'enable_css', True),
+         (b'enable_css_minification', True),
+         (b'enable_merging_of_css', True),
+         (b'remove_print_mediatypes', False),
+         (b'inline_css', False),
+         (b'enable_js', True),
+         (b'enable_js_minification', True),
+         (b'enable_merging_of_js', True),
+         (b'enable_defer_js', b'individual'),
+         (b'defer_js_type', b'defer'),
+         (b'defer_jquery', True),
+         (b'enable_js_trycatch', False),
+         (b'exclude_defer_login', True),
+         (b'cdn_url', b''),
+         (b'cdn_force', False),
+         (b'async_css', b''),
+         (b'async_js', b''),
+         (b'disable_css_inline_merge', True),
+         (b'ualist', [(0, b'x11.*fox\\/54'),
+                      (1, b'oid\\s4.*xus.*ome\\/62'),
+                      (2, b'x11.*ome\\/62'),
+                      (3, b'oobot'),
+                      (4, b'ighth'),
+                      (5, b'tmetr'),
+                      (6, b'eadles'),
+                      (7, b'ingdo')]),
+         (b'exclude_js_from_page_speed_tools', False),
+         (b'exclude_css_from_page_speed_tools', False),
+         (b'blacklist', []),
+         (b'ignore_list', []),
+         (b'exclude_js', b''),
+         (b'exclude_css', b''),
+         (b'edit_default_exclutions', False),
+         (b'merge_allowed_urls', b''),
+         (b'enabled', True),
+         (b'last-cache-update', 1706195082),
+         (b'plugin_version', b'0.0.0'),
+         (b'cache_lifespan', 30),
+         (b'merge_inline_extra_css_js', True),
+         (b'include_ui_elements', True)]
+     ],
+    [_PERSON_SERIALIZED, _PERSON],
+)
+
+
+IDEMPOTENCE_CASES = (
+    b"i:124;",
+    b"d:124.56;",
+    b"b:0;",
+    b"b:1;",
+    b"N;",
+    b"i:1706195082;",
+    b"i:-124;",
+    b's:1500:"' + b"x" * 1500 + b'";',
+    b"a:2:{i:0;i:0;i:1;i:1;}",
+    b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}',
+    _PERSON_SERIALIZED,
+)
+
+
+QUERY_CASES = (
+    [_PAIR_01, b"G:1", 1],
+    [[(0, 0), (1, [(b"a", 10), (b"b", 12)])], b'G:1/"b"', 12],
+    [12.3, b"G:", 12.3],
+    [12.3, b"G:1", None],
+    [[], b"G:1", None],
+    [[], b"G:", []],
+    [_PERSON, b'G:"name"', b'Jane'],
+    [_PERSON, bytearray(b'G:"name"'), b'Jane'],
+    [_PAIR_01, b"S:2/1=3", [
+        (0, 0), (1, 1), (2, [(1, 3)])]],
+    [_PAIR_01, b"S:=3", 3],
+    [_PAIR_01, b'S:="xyz"', b"xyz"],
+    [_PAIR_01, b'S:0="xyz"', [(0, b"xyz"), (1, 1)]],
+    [_PAIR_01, b"S:0=false", [(0, False), (1, 1)]],
+    [_PAIR_01, b"S:1=true", [(0, 0), (1, True)]],
+    [_PAIR_01, b"S:0=[0:0,1:1]", [(0, _PAIR_01), (1, 1)]],
+    [None, b'S:=[["a":"b","c":"d"]:true]',
+        [([(b"a", b"b"), (b"c", b"d")], True)]],
+    [_PAIR_01, b"S:=3.3", 3.3],
+    [[(3.3, 0), (1, 1)], b"S:3.3=1", [(3.3, 1), (1, 1)]],
+    [_PERSON, b'S:"name"="John"',
+     (b"Person", [(b"name", b"John"), (b"age", 25)])],
+    [None, b'S:="a\\"b\\\\c"', b'a"b\\c'],
+    [None, b"S:=-12.5", -12.5],
+    [None, b"S:=-.5", -0.5],
+    [[(-0.5, 2)], b"G:-.5", 2],
+    [None, bytearray(b'S:="xyz"'), b"xyz"],
+    [[(0, (b"C", [(b"x", 1)])), (1, 1)], b'S:0/"y"=2',
+     [(0, (b"C", [(b"x", 1), (b"y", 2)])), (1, 1)]],
+    [[(1, 1), (1, 2)], b"S:1=9", [(1, 9), (1, 9)]],
+    [[(1, [(0, 0)]), (2, 2), (1, [(5, 5)])], b"S:1/0=9",
+     [(1, [(0, 9)]), (2, 2), (1, [(5, 5), (0, 9)])]],
+    [_PAIR_01, b"D:0", [(1, 1)]],
+    [[(0, 0), (1, [(b"a", 10), (b"b", 12)])], b'D:1/"b"',
+     [(0, 0), (1, [(b"a", 10)])]],
+    [_PERSON, b'D:"name"', (b"Person", [(b"age", 25)])],
+    [[(0, (b"C", [(b"x", 1)])), (1, 1)], b'D:0/"x"',
+     [(0, (b"C", [])), (1, 1)]],
+    [[(1, [(0, 0)]), (1, [(0, 0)])], b"D:1/0", [(1, []), (1, [])]],
+)
+
+
+MODIFY_CASES = (
+    [b"i:124;", b"S:=125", b"i:125;"],
+    [b"i:124;", b"S:=null", b"N;"],
+    [b"b:0;", b'S:=[["a":"b","c":"d"]:true]',
+        b'a:1:{a:2:{s:1:"a";s:1:"b";s:1:"c";s:1:"d";}b:1;}'],
+    [b"b:0;", b'S:={"Person",["name":"Jane","age":25]}',
+        _PERSON_SERIALIZED],
+    [b"a:2:{i:0;i:0;i:1;i:1;}", b"D:1", b"a:1:{i:0;i:0;}"],
+    [b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}',
+        b'S:0/"a"=12',
+        b'a:3:{i:0;a:2:{s:1:"a";i:12;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}'],
+)
+
+
+INVALID_SERIALIZED_CASES = (
+    b"",
+    b"x:1;",
+    b"i:;",
+    b"i: 1;",
+    b"b:x;",
+    b"d:abc;",
+    b"d:;",
+    b's:5:"abc";',
+    b's:1:"abc";',
+    b"a:1:{i:0;}",
+    b"a:1:{i:0;i:0;i:1;i:1;}",
+    b'O:1:"A":1:{}',
+)
+
+
+INVALID_VALUE_CASES = (
+    (1, 2),
+    {},
+    [(0, {b"a", b"b"})],
+)
+
+
+INVALID_COMMAND_CASES = (
+    b"G=123",
+    b"G:123.abc",
+    b"S:123=abc",
+    b"S:key:value",
+    b"D:abc.def",
+    b"D:123 456",
+    b"S:=-",
+    b"S:=-.",
+)
+
+
+# These test strings are generated from the grammar by the
+# generate_grammar_valid_expression.py script
+VALID_EXPRESSIONS: tuple[bytes, ...] = (
+    b'S:"~[8({8"=274854184549.',
+    b'S:3532498418096=-9.',
+    b'D:-91030637933084',
+    b'D:"Rar"',
+    b'S:1681484771.15129203520626/"8"/"c ."/"L4n I?uK[$DD28"=true',
+    b'D:" ;5eRP@m?9$s!"',
+    b'D:-092133437',
+    b'S:130242026102283={"(Elb!",[-112497.:false]}',
+    b'G:"\\\\\\"ILW&f_\'^p*z"/-6568038851458/"IZth~N3\'\'"',
+    b'G:"du>"',
+    b'G:0486008537567',
+    b'D:0276208105',
+    b'D:"v"',
+    b'D:78505263961039',
+    b'S:"0@5H=yzJZ(5"="G8;Bj"',
+    b'S:"x^"="3{j"',
+    b'D:"QqK{H^vk"/390488793.47177522718',
+    b'D:35355846318.7478',
+    b'D:"lrxQSVE|)afn"',
+    b'D:"NAgjq<fiK<+I W"/"X$e"',
+    b'S:"&S"/"]5.1WfniZ{7ZX\\\\"/">"/"wt"/545435/"(ZI _/yaA\\\\.:wR"=null',
+    b'D:"~lGw\'j8\\\\v9/J"/"IG{"/-645778289323/"RL?|PMAERu"',
+    b'D:-946689.85350436281/2392057626446/"3t~"',
+    b'G:"Pk#D+2gzKOMKK^Z"/"Jl^b56c"/"BnTy/Mr?\\\\n"',
+    b'S:957020607.813783/-0.37283="<R R_X"',
+    b'D:"#xdo_"/"_Trp~"',
+    b'G:6243700922525',
+    b'D:"72@U62DC5\\\\@f]~"',
+    b'S:=69568647142642',
+    b'S:"qN!GX-,4*|an<dz"/"2pQ~J[]="=-15830.8590',
+    b'D:-8785',
+    b'S:=true',
+    b'S:"{AVI"="}uxz_6D6pu1"',
+    b'S:"p3$(`PC^# b&"/"T%|W"/-823903557300=">gmM=\'0t"',
+    b'G:',
+    b'D:",%A5.J=voaN"',
+    b'S:238469853827="nYM;=iv6Auj\'hIb"',
+    b'D:"-Arv84;Eg7"',
+    b'D:"LTET&o6ZV8g5j"/432345365374610',
+    b'S:=null',
+    b'D:"j`.[p"/"`/\'Q+mE"',
+    b'G:73563294540140',
+    b'S:"eZ"=")dXG*Eq5t8+j"',
+    b'S:"g`"="X4iF$nkAY)\\"b"',
+    b'D:9745778/17971858.328806',
+    b'D:"hrd,D$,\\\\G}[E-+"',
+    b'G:"rp)"',
+    b'S:"pND:\\\\Y\\\\U~p)F]E"="^(@jBR-C%fT#\'%e"',
+    b'S:="u,i"',
+    b'G:"7;]at!Y"/"HUd=%*afM.7"',
+    b'G:11.258/41642.73690279/7913780074668.74238/531401179/234.314245969/"_^"/-6209',
+    b'D:-3120426989.0878',
+    b'S:568120995.4006291910=-4533433',
+    b'D:9491207.44417093190/"v8v^4R(P"/-38312409',
+    b'S:=44788.',
+    b'S:=07305411.929',
+    b'S:"@[sTaZD}M"="gb|?"',
+    b'D:"yZlj"/0.3/"WM&2\'X4:-;"/"yK{Js8"',
+    b'S:="*k.X>:<n:Z-}V"',
+    b'D:711994444575',
+    b'S:=-311978644542.882',
+    b'D:-98894239988950.140390692711',
+    b'D:099233818/-466.51952/-76/"M2t.IB"/695396722265.6527346097253',
+    b'D:"y{o!/GF:~"/"sK2td>8>kA*XoTt"/5767494/83/"mbR*s[)v"',
+    b'D:379718770/614078',
+    b'S:-64209=1',
+    b'D:46542413718657',
+    b'S:"B,"=-66.84852905637',
+    b'G:-4523535076510/7532346520/-044462410718',
+    b'S:-69277.3391/-424.452/-56106125588042/-97.889048286374/-080.9975456542971/"jA:?rcuO"=38846189433366',
+    b'S:"D"=":Z("',
+    b'S:0959080/"\\\\"=false',
+    b'S:"|n#%@Bs@$Z"/0739182672641/-87432603940797.44470=null',
+    b'S:="&3%I4m7;k\\\\"',
+    b'D:3.058732131',
+    b'D:248',
+    b'G:"kXqr3(6Yu[bla{"',
+    b'D:"=8"',
+    b'G:"8"',
+    b'G:" Di,Bk"',
+)
+
+
+INVALID_EXPRESSIONS: tuple[bytes, ...] = (
+    b': =  {xxx X  zxI+ 3,[ullxtrue nullx6 53 8 9 26 5  ] }',
+    b'x59xxx',
+    b'x = ull',
+    b' D:" ix H qe  \\\\ (xR0  ^x B.x/ -  4 74x 72  16 0 x1 6 . 3',
+    b'S- 8 2 4 92xxx5  43xx"  1b9  yx',
+    b' S:73 60 3 x 1',
+    b':" F zx 9 iNd^ " /xR g-0 x 838 4x4 2x 4=x',
+    b':xx[ y x+y x 0v x7 /x70 x 12  8 1',
+    b'D: " 81  ; L3 E &r "| x oa O jxC"',
+    b':  -x .',
+    b'D: xoxx/  9 16 x5 3x3 x 4 /w w"x 7x16 15 4 /]q \\\\ 5 "',
+    b'D0/" \\W  f10sJxx"',
+    b'Snul',
+    b'D: x S) o Ex" ',
+    b':- .9 7 ',
+    b' D:x',
+    b':xxrue',
+    b':57 x0 xx4 8 8 /-  0 1xx2 873/  -x9 x6 xxx -6xx 2',
+    b'D:"aW 6$x',
+    b' D:[y "xx4 x4 08 1 x2  . 3x3 xx^" ',
+    b'D: - 94  4x7 .x0  3',
+    b':x 5x 24 02 3x11  7 .x 9 0x',
+    b'Dx2 0x.x 6 03 5 2x5 )"x]l]" xx 173 / "  gxS  "',
+    b'Sxx',
+    b' D:x }P x',
+    b'Dxx. x',
+    b' G:',
+    b'x4 3x30x7x',
+    b'xxx',
+    b'x" x@ F xZ? x =xx 85 ',
+    b'G:B y=x( +x',
+    b': = - 5 4xx6 7 0x4',
+    b' G: ". O xj xN xK 8D',
+    b' D: "h   i lx[x exx @xjx 4x "',
+    b'x 9',
+    b'D:x c ncMs o \\xt N.  K"x-7 8  26 "xxxx @ @i j',
+    b'x - 6401 xx9 x82 7586 6 x 9/ 6 9 1x 7',
+    b' G:x 735 20  0',
+    b' D:91 xx 640 x6 3x0 74 46 x',
+    b'D" = cx',
+    b'D: 8 8 x 88  3',
+    b'x "1J >  }[  2 < "x7  56 5  1',
+    b': "T QxxVxxn x" /x6 !s "',
+    b'G: ',
+    b'xG R xer Bxx',
+    b'S: x= null',
+    b' S:xxull',
+    b'D: "xg  /66 0 5xx 79 7 7x9 ',
+    b'Sx1 xxx2x x oxx7 G xx= rue',
+    b' S:"  =xOx | 7x"-2 / 8  fP  sxH xT z"/"xs  qLx Bx" x " Qt xt % j',
+    b' D:x 1 .8 x 5xx[t "',
+    b' S: "D R ,xx IXq % uxalse',
+    b'Gxu v2 $x !/  "xx xx03 x5 5 6 3xxx .x',
+    b'S:  "I u4"',
+    b'S: "b :x} - tru',
+    b'D3 9xx 8x63 908',
+    b'x 0xtru',
+    b'x',
+    b'Dx836 23 xx- 9 0 077 xx',
+    b':x= "0 Q$ xx \\"(  wx',
+    b'x 39 6 7 2 6= true',
+    b' G: 39x1x8 . 6 0 x00x5  8/ "  x#"/ 32 x8 2 0',
+    b'D: " ox   F> #xVx4  "/" x Y.Zxxs  k" wx',
+    b'S5 1 2x 46xxx= gc  ^\\ "',
+    b'S: 5  04  3795nul',
+    b' G:x',
+    b'G:"] x"x1 6 2 ',
+    b'G:  ',
+    b'S- x9x9  .1 1 /  - 3 7 7x=! t sf  5y8 " ',
+    b'x" = + 0J v xxx7x8x.9 xxxl  00 mx   a %h x"x"Z 1 O~',
+    b': ',
+    b'Gxx4 x 214x8 5xx5 9 9',
+    b'Sxx v@x86 8 6 21 2 3 4 x-8 3 2  77 x99 x2  5 0 55 9 =xx Ox Rxx)_ >!x',
+    b' D: -7 25  20 x5 3x/ " / x ^xx68 67  9x3 . 63 xx5 xxA ` xc xtE%8 gd" "x/-7 9  9 1777x38 8 6x-  68  5x9  46 00 0 6  3 2x/ @x;J  3xd/  1x 05 x8 14 x4 6  .xxx 0x8 35',
+    b' S:x6 6x0 89 false ',
+    b'x ',
+    b'G:x',
+    b' S:"; f 9xx10 00 24 29 55 ."Vw  -O Pjv 7  = &"x[ x!mx"',
+    b' G: ": xh >xWx"S  \\\\x& "',
+    b' S:x = null',
+    b'D: 3 49 4  82xxxx1  98 5 9 9',
+    b'D: x? aA R:/" ) 3xx dx; 6x/ x79xxx.  0xx 831 41  5',
+    b'S:1 0 1 37x2x 7x 9x null',
+    b'D7 9  41 / x3 4 "  ( yx"',
+    b' D:4 939 3 ',
+    b'x - 2 5 46x87 x 1 73  8 /" _xF ~ 6  C "',
+    b'G" N |\\\\\'5x 940 9 9 482x4  71 xx0 26 ',
+    b'xx"  =xxx 84x2  699 ',
+    b':xxxW &x',
+    b'S:={"",[]}',
+)
+
 class TestPHPSerializeEdit(TestCase):
-    @parameterized.expand([
-        ["int", b"i:124;", 124],
-        ["float", b"d:124.56;", 124.56],
-        ["false", b"b:0;", False],
-        ["true", b"b:1;", True],
-        ["array1", b"a:2:{i:0;i:0;i:1;i:1;}", [(0, 0), (1, 1)]],
-        ["array2", b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}',
-            [(0, [(b"a", True), (b"b", False)]), (1, 0), (2, 1)]],
-        ["array3", b'a:53:{s:5:"debug";b:0;s:19:"enabled_css_preload";b:0;s:18:"enabled_js_preload";b:0;s:11:"hpreconnect";s:0:"";s:8:"hpreload";s:0:"";s:7:"loadcss";b:0;s:10:"remove_css";b:0;s:17:"critical_path_css";s:0:"";s:31:"critical_path_css_is_front_page";s:0:"";s:30:"preserve_settings_on_uninstall";b:1;s:22:"disable_when_logged_in";b:0;s:16:"default_protocol";s:7:"dynamic";s:17:"html_minification";b:1;s:16:"clean_header_one";b:0;s:13:"emoji_removal";b:1;s:18:"merge_google_fonts";b:1;s:19:"enable_display_swap";b:1;s:18:"remove_googlefonts";b:0;s:13:"gfonts_method";s:7:"inherit";s:15:"fawesome_method";s:7:"inherit";s:10:"enable_css";b:1;s:23:"enable_css_minification";b:1;s:21:"enable_merging_of_css";b:1;s:23:"remove_print_mediatypes";b:0;s:10:"inline_css";b:0;s:9:"enable_js";b:1;s:22:"enable_js_minification";b:1;s:20:"enable_merging_of_js";b:1;s:15:"enable_defer_js";s:10:"individual";s:13:"defer_js_type";s:5:"defer";s:12:"defer_jquery";b:1;s:18:"enable_js_trycatch";b:0;s:19:"exclude_defer_login";b:1;s:7:"cdn_url";s:0:"";s:9:"cdn_force";b:0;s:9:"async_css";s:0:"";s:8:"async_js";s:0:"";s:24:"disable_css_inline_merge";b:1;s:6:"ualist";a:8:{i:0;s:12:"x11.*fox\\/54";i:1;s:20:"oid\\s4.*xus.*ome\\/62";i:2;s:12:"x11.*ome\\/62";i:3;s:5:"oobot";i:4;s:5:"ighth";i:5;s:5:"tmetr";i:6;s:6:"eadles";i:7;s:5:"ingdo";}s:32:"exclude_js_from_page_speed_tools";b:0;s:33:"exclude_css_from_page_speed_tools";b:0;s:9:"blacklist";a:0:{}s:11:"ignore_list";a:0:{}s:10:"exclude_js";s:0:"";s:11:"exclude_css";s:0:"";s:23:"edit_default_exclutions";b:0;s:18:"merge_allowed_urls";s:0:"";s:7:"enabled";b:1;s:17:"last-cache-update";i:1706195082;s:14:"plugin_version";s:5:"0.0.0";s:14:"cache_lifespan";i:30;s:25:"merge_inline_extra_css_js";b:1;s:19:"include_ui_elements";b:1;}',
-         [(b'debug', False),
-          (b'enabled_css_preload', False),
-             (b'enabled_js_preload', False),
-             (b'hpreconnect', b''),
-             (b'hpreload', b''),
-             (b'loadcss', False),
-             (b'remove_css', False),
-             (b'critical_path_css', b''),
-             (b'critical_path_css_is_front_page', b''),
-             (b'preserve_settings_on_uninstall', True),
-             (b'disable_when_logged_in', False),
-             (b'default_protocol', b'dynamic'),
-             (b'html_minification', True),
-             (b'clean_header_one', False),
-             (b'emoji_removal', True),
-             (b'merge_google_fonts', True),
-             (b'enable_display_swap', True),
-             (b'remove_googlefonts', False),
-             (b'gfonts_method', b'inherit'),
-             (b'fawesome_method', b'inherit'),
-             (b'enable_css', True),
-             (b'enable_css_minification', True),
-             (b'enable_merging_of_css', True),
-             (b'remove_print_mediatypes', False),
-             (b'inline_css', False),
-             (b'enable_js', True),
-             (b'enable_js_minification', True),
-             (b'enable_merging_of_js', True),
-             (b'enable_defer_js', b'individual'),
-             (b'defer_js_type', b'defer'),
-             (b'defer_jquery', True),
-             (b'enable_js_trycatch', False),
-             (b'exclude_defer_login', True),
-             (b'cdn_url', b''),
-             (b'cdn_force', False),
-             (b'async_css', b''),
-             (b'async_js', b''),
-             (b'disable_css_inline_merge', True),
-             (b'ualist', [(0, b'x11.*fox\\/54'),
-                          (1, b'oid\\s4.*xus.*ome\\/62'),
-                          (2, b'x11.*ome\\/62'),
-                          (3, b'oobot'),
-                          (4, b'ighth'),
-                          (5, b'tmetr'),
-                          (6, b'eadles'),
-                          (7, b'ingdo')]),
-             (b'exclude_js_from_page_speed_tools', False),
-             (b'exclude_css_from_page_speed_tools', False),
-             (b'blacklist', []),
-             (b'ignore_list', []),
-             (b'exclude_js', b''),
-             (b'exclude_css', b''),
-             (b'edit_default_exclutions', False),
-             (b'merge_allowed_urls', b''),
-             (b'enabled', True),
-             (b'last-cache-update', 1706195082),
-             (b'plugin_version', b'0.0.0'),
-             (b'cache_lifespan', 30),
-             (b'merge_inline_extra_css_js', True),
-             (b'include_ui_elements', True)]
-         ],
-        ["object1", b'O:6:"Person":2:{s:4:"name";s:4:"Jane";s:3:"age";i:25;}',
-            (b"Person", [(b"name", b"Jane"), (b"age", 25)])],
-    ])
-    def test_php_unserialize(self, _name, serialized, expected):
-        self.assertEqual(php_unserialize(serialized), expected)
-
-    @parameterized.expand([
-        ["int", b"i:124;"],
-        ["float", b"d:124.56;"],
-        ["false", b"b:0;"],
-        ["true", b"b:1;"],
-        ["array1", b"a:2:{i:0;i:0;i:1;i:1;}"],
-        ["array2",
-            b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}'],
-        ["object1", b'O:6:"Person":2:{s:4:"name";s:4:"Jane";s:3:"age";i:25;}'],
-    ])
-    def test_idempotence(self, _name, serialized):
-        self.assertEqual(php_serialize(
-            php_unserialize(serialized)), serialized)
-
-    @parameterized.expand([
-        ["get1", [(0, 0), (1, 1)], b"G:1", 1],
-        ["get2", [(0, 0), (1, [(b"a", 10), (b"b", 12)])], b'G:1/"b"', 12],
-        ["get3", 12.3, b"G:", 12.3],
-        ["get4", 12.3, b"G:1", None],
-        ["get5", [], b"G:1", None],
-        ["get6", [], b"G:", []],
-        ["get7", (b"Person", [(b"name", b"Jane"), (b"age", 25)]),
-         b'G:"name"', b'Jane'],
-        ["set1", [(0, 0), (1, 1)], b"S:2/1=3", [
-            (0, 0), (1, 1), (2, [(1, 3)])]],
-        ["set2", [(0, 0), (1, 1)], b"S:=3", 3],
-        ["set3", [(0, 0), (1, 1)], b'S:="xyz"', b"xyz"],
-        ["set4", [(0, 0), (1, 1)], b'S:0="xyz"', [(0, b"xyz"), (1, 1)]],
-        ["set5", [(0, 0), (1, 1)], b"S:0=false", [(0, False), (1, 1)]],
-        ["set6", [(0, 0), (1, 1)], b"S:1=true", [(0, 0), (1, True)]],
-        ["set7", [(0, 0), (1, 1)], b"S:0=[0:0,1:1]", [(0, [(0, 0), (1, 1)]),
-                                                      (1, 1)]],
-        ["set8", None, b'S:=[["a":"b","c":"d"]:true]',
-            [([(b"a", b"b"), (b"c", b"d")], True)]],
-        ["set9", [(0, 0), (1, 1)], b"S:=3.3", 3.3],
-        ["set10", [(3.3, 0), (1, 1)], b"S:3.3=1", [(3.3, 1), (1, 1)]],
-        ["set11", (b"Person", [(b"name", b"Jane"), (b"age", 25)]),
-         b'S:"name"="John"', (b"Person", [(b"name", b"John"), (b"age", 25)])],
-        ["delete1", [(0, 0), (1, 1)], b"D:0", [(1, 1)]],
-        ["delete2", [(0, 0), (1, [(b"a", 10), (b"b", 12)])], b'D:1/"b"',
-         [(0, 0), (1, [(b"a", 10)])]],
-        ["delete3", (b"Person", [(b"name", b"Jane"), (b"age", 25)]),
-         b'D:"name"', (b"Person", [(b"age", 25)])],
-    ])
-    def test_query(self, _name, initial, expression, expected):
-        self.assertEqual(Query(initial).run(expression), expected)
-
-    @parameterized.expand([
-        ["int", b"i:124;", b"S:=125", b"i:125;"],
-        ["set1", b"b:0;", b'S:=[["a":"b","c":"d"]:true]',
-            b'a:1:{a:2:{s:1:"a";s:1:"b";s:1:"c";s:1:"d";}b:1;}'],
-        ["set2", b"b:0;", b'S:={"Person",["name":"Jane","age":25]}',
-            b'O:6:"Person":2:{s:4:"name";s:4:"Jane";s:3:"age";i:25;}'],
-        ["array1", b"a:2:{i:0;i:0;i:1;i:1;}", b"D:1", b"a:1:{i:0;i:0;}"],
-        ["array2",
-            b'a:3:{i:0;a:2:{s:1:"a";b:1;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}',
-            b'S:0/"a"=12',
-            b'a:3:{i:0;a:2:{s:1:"a";i:12;s:1:"b";b:0;}i:1;i:0;i:2;i:1;}'],
-    ])
-    def test_php_modify(self, _name, serialized, expression, expected):
-        self.assertEqual(php_modify(serialized, expression), expected)
-
-    @parameterized.expand([
-        ["invalid_get1", b"G=123"],
-        ["invalid_get2", b"G:123.abc"],
-        ["invalid_set1", b"S:123=abc"],
-        ["invalid_set2", b"S:key:value"],
-        ["invalid_delete1", b"D:abc.def"],
-        ["invalid_delete2", b"D:123 456"]
-    ])
-    def test_invalid(self, _name, expression):
-        with self.assertRaises(ParseError):
-            Query([]).run(expression)
-
-    # These test strings are generated from the grammar by the
-    # generate_grammar_valid_expression.py script
-    @parameterized.expand([
-        ["valid", b'S:"~[8({8"=274854184549.'],
-        ["valid", b'S:3532498418096=-9.'],
-        ["valid", b'D:-91030637933084'],
-        ["valid", b'D:"Rar"'],
-        ["valid", b'S:1681484771.15129203520626/"8"/"c ."/"L4n I?uK[$DD28"=true'],
-        ["valid", b'D:" ;5eRP@m?9$s!"'],
-        ["valid", b'D:-092133437'],
-        ["valid", b'S:130242026102283={"(Elb!",[-112497.:false]}'],
-        ["valid", b'G:"\\\\\\"ILW&f_\'^p*z"/-6568038851458/"IZth~N3\'\'"'],
-        ["valid", b'G:"du>"'],
-        ["valid", b'G:0486008537567'],
-        ["valid", b'D:0276208105'],
-        ["valid", b'D:"v"'],
-        ["valid", b'D:78505263961039'],
-        ["valid", b'S:"0@5H=yzJZ(5"="G8;Bj"'],
-        ["valid", b'S:"x^"="3{j"'],
-        ["valid", b'D:"QqK{H^vk"/390488793.47177522718'],
-        ["valid", b'D:35355846318.7478'],
-        ["valid", b'D:"lrxQSVE|)afn"'],
-        ["valid", b'D:"NAgjq<fiK<+I W"/"X$e"'],
-        ["valid",
-            b'S:"&S"/"]5.1WfniZ{7ZX\\\\"/">"/"wt"/545435/"(ZI _/yaA\\\\.:wR"=null'],
-        ["valid", b'D:"~lGw\'j8\\\\v9/J"/"IG{"/-645778289323/"RL?|PMAERu"'],
-        ["valid", b'D:-946689.85350436281/2392057626446/"3t~"'],
-        ["valid", b'G:"Pk#D+2gzKOMKK^Z"/"Jl^b56c"/"BnTy/Mr?\\\\n"'],
-        ["valid", b'S:957020607.813783/-0.37283="<R R_X"'],
-        ["valid", b'D:"#xdo_"/"_Trp~"'],
-        ["valid", b'G:6243700922525'],
-        ["valid", b'D:"72@U62DC5\\\\@f]~"'],
-        ["valid", b'S:=69568647142642'],
-        ["valid", b'S:"qN!GX-,4*|an<dz"/"2pQ~J[]="=-15830.8590'],
-        ["valid", b'D:-8785'],
-        ["valid", b'S:=true'],
-        ["valid", b'S:"{AVI"="}uxz_6D6pu1"'],
-        ["valid", b'S:"p3$(`PC^# b&"/"T%|W"/-823903557300=">gmM=\'0t"'],
-        ["valid", b'G:'],
-        ["valid", b'D:",%A5.J=voaN"'],
-        ["valid", b'S:238469853827="nYM;=iv6Auj\'hIb"'],
-        ["valid", b'D:"-Arv84;Eg7"'],
-        ["valid", b'D:"LTET&o6ZV8g5j"/432345365374610'],
-        ["valid", b'S:=null'],
-        ["valid", b'D:"j`.[p"/"`/\'Q+mE"'],
-        ["valid", b'G:73563294540140'],
-        ["valid", b'S:"eZ"=")dXG*Eq5t8+j"'],
-        ["valid", b'S:"g`"="X4iF$nkAY)\\"b"'],
-        ["valid", b'D:9745778/17971858.328806'],
-        ["valid", b'D:"hrd,D$,\\\\G}[E-+"'],
-        ["valid", b'G:"rp)"'],
-        ["valid", b'S:"pND:\\\\Y\\\\U~p)F]E"="^(@jBR-C%fT#\'%e"'],
-        ["valid", b'S:="u,i"'],
-        ["valid", b'G:"7;]at!Y"/"HUd=%*afM.7"'],
-        ["valid", b'G:11.258/41642.73690279/7913780074668.74238/531401179/234.314245969/"_^"/-6209'],
-        ["valid", b'D:-3120426989.0878'],
-        ["valid", b'S:568120995.4006291910=-4533433'],
-        ["valid", b'D:9491207.44417093190/"v8v^4R(P"/-38312409'],
-        ["valid", b'S:=44788.'],
-        ["valid", b'S:=07305411.929'],
-        ["valid", b'S:"@[sTaZD}M"="gb|?"'],
-        ["valid", b'D:"yZlj"/0.3/"WM&2\'X4:-;"/"yK{Js8"'],
-        ["valid", b'S:="*k.X>:<n:Z-}V"'],
-        ["valid", b'D:711994444575'],
-        ["valid", b'S:=-311978644542.882'],
-        ["valid", b'D:-98894239988950.140390692711'],
-        ["valid", b'D:099233818/-466.51952/-76/"M2t.IB"/695396722265.6527346097253'],
-        ["valid", b'D:"y{o!/GF:~"/"sK2td>8>kA*XoTt"/5767494/83/"mbR*s[)v"'],
-        ["valid", b'D:379718770/614078'],
-        ["valid", b'S:-64209=1'],
-        ["valid", b'D:46542413718657'],
-        ["valid", b'S:"B,"=-66.84852905637'],
-        ["valid", b'G:-4523535076510/7532346520/-044462410718'],
-        ["valid", b'S:-69277.3391/-424.452/-56106125588042/-97.889048286374/-080.9975456542971/"jA:?rcuO"=38846189433366'],
-        ["valid", b'S:"D"=":Z("'],
-        ["valid", b'S:0959080/"\\\\"=false'],
-        ["valid", b'S:"|n#%@Bs@$Z"/0739182672641/-87432603940797.44470=null'],
-        ["valid", b'S:="&3%I4m7;k\\\\"'],
-        ["valid", b'D:3.058732131'],
-        ["valid", b'D:248'],
-        ["valid", b'G:"kXqr3(6Yu[bla{"'],
-        ["valid", b'D:"=8"'],
-        ["valid", b'G:"8"'],
-        ["valid", b'G:" Di,Bk"'],
-    ])
-    def test_valid(self, _name, expression):
-        try:
-            Query([]).run(expression)
-        except ParseError as e:
-            raise AssertionError(f'Error on {expression}: {e}')
-
-    @parameterized.expand([
-        ["invalid", b': =  {xxx X  zxI+ 3,[ullxtrue nullx6 53 8 9 26 5  ] }'],
-        ["invalid", b'x59xxx'],
-        ["invalid", b'x = ull'],
-        ["invalid",
-            b' D:" ix H qe  \\\\ (xR0  ^x B.x/ -  4 74x 72  16 0 x1 6 . 3'],
-        ["invalid", b'S- 8 2 4 92xxx5  43xx"  1b9  yx'],
-        ["invalid", b' S:73 60 3 x 1'],
-        ["invalid", b':" F zx 9 iNd^ " /xR g-0 x 838 4x4 2x 4=x'],
-        ["invalid", b':xx[ y x+y x 0v x7 /x70 x 12  8 1'],
-        ["invalid", b'D: " 81  ; L3 E &r "| x oa O jxC"'],
-        ["invalid", b':  -x .'],
-        ["invalid", b'D: xoxx/  9 16 x5 3x3 x 4 /w w"x 7x16 15 4 /]q \\\\ 5 "'],
-        ["invalid", b'D0/" \\W  f10sJxx"'],
-        ["invalid", b'Snul'],
-        ["invalid", b'D: x S) o Ex" '],
-        ["invalid", b':- .9 7 '],
-        ["invalid", b' D:x'],
-        ["invalid", b':xxrue'],
-        ["invalid", b':57 x0 xx4 8 8 /-  0 1xx2 873/  -x9 x6 xxx -6xx 2'],
-        ["invalid", b'D:"aW 6$x'],
-        ["invalid", b' D:[y "xx4 x4 08 1 x2  . 3x3 xx^" '],
-        ["invalid", b'D: - 94  4x7 .x0  3'],
-        ["invalid", b':x 5x 24 02 3x11  7 .x 9 0x'],
-        ["invalid", b'Dx2 0x.x 6 03 5 2x5 )"x]l]" xx 173 / "  gxS  "'],
-        ["invalid", b'Sxx'],
-        ["invalid", b' D:x }P x'],
-        ["invalid", b'Dxx. x'],
-        ["invalid", b' G:'],
-        ["invalid", b'x4 3x30x7x'],
-        ["invalid", b'xxx'],
-        ["invalid", b'x" x@ F xZ? x =xx 85 '],
-        ["invalid", b'G:B y=x( +x'],
-        ["invalid", b': = - 5 4xx6 7 0x4'],
-        ["invalid", b' G: ". O xj xN xK 8D'],
-        ["invalid", b' D: "h   i lx[x exx @xjx 4x "'],
-        ["invalid", b'x 9'],
-        ["invalid", b'D:x c ncMs o \\xt N.  K"x-7 8  26 "xxxx @ @i j'],
-        ["invalid", b'x - 6401 xx9 x82 7586 6 x 9/ 6 9 1x 7'],
-        ["invalid", b' G:x 735 20  0'],
-        ["invalid", b' D:91 xx 640 x6 3x0 74 46 x'],
-        ["invalid", b'D" = cx'],
-        ["invalid", b'D: 8 8 x 88  3'],
-        ["invalid", b'x "1J >  }[  2 < "x7  56 5  1'],
-        ["invalid", b': "T QxxVxxn x" /x6 !s "'],
-        ["invalid", b'G: '],
-        ["invalid", b'xG R xer Bxx'],
-        ["invalid", b'S: x= null'],
-        ["invalid", b' S:xxull'],
-        ["invalid", b'D: "xg  /66 0 5xx 79 7 7x9 '],
-        ["invalid", b'Sx1 xxx2x x oxx7 G xx= rue'],
-        ["invalid", b' S:"  =xOx | 7x"-2 / 8  fP  sxH xT z"/"xs  qLx Bx" x " Qt xt % j'],
-        ["invalid", b' D:x 1 .8 x 5xx[t "'],
-        ["invalid", b' S: "D R ,xx IXq % uxalse'],
-        ["invalid", b'Gxu v2 $x !/  "xx xx03 x5 5 6 3xxx .x'],
-        ["invalid", b'S:  "I u4"'],
-        ["invalid", b'S: "b :x} - tru'],
-        ["invalid", b'D3 9xx 8x63 908'],
-        ["invalid", b'x 0xtru'],
-        ["invalid", b'x'],
-        ["invalid", b'Dx836 23 xx- 9 0 077 xx'],
-        ["invalid", b':x= "0 Q$ xx \\"(  wx'],
-        ["invalid", b'x 39 6 7 2 6= true'],
-        ["invalid", b' G: 39x1x8 . 6 0 x00x5  8/ "  x#"/ 32 x8 2 0'],
-        ["invalid", b'D: " ox   F> #xVx4  "/" x Y.Zxxs  k" wx'],
-        ["invalid", b'S5 1 2x 46xxx= gc  ^\\ "'],
-        ["invalid", b'S: 5  04  3795nul'],
-        ["invalid", b' G:x'],
-        ["invalid", b'G:"] x"x1 6 2 '],
-        ["invalid", b'G:  '],
-        ["invalid", b'S- x9x9  .1 1 /  - 3 7 7x=! t sf  5y8 " '],
-        ["invalid", b'x" = + 0J v xxx7x8x.9 xxxl  00 mx   a %h x"x"Z 1 O~'],
-        ["invalid", b': '],
-        ["invalid", b'Gxx4 x 214x8 5xx5 9 9'],
-        ["invalid", b'Sxx v@x86 8 6 21 2 3 4 x-8 3 2  77 x99 x2  5 0 55 9 =xx Ox Rxx)_ >!x'],
-        ["invalid", b' D: -7 25  20 x5 3x/ " / x ^xx68 67  9x3 . 63 xx5 xxA ` xc xtE%8 gd" "x/-7 9  9 1777x38 8 6x-  68  5x9  46 00 0 6  3 2x/ @x;J  3xd/  1x 05 x8 14 x4 6  .xxx 0x8 35'],
-        ["invalid", b' S:x6 6x0 89 false '],
-        ["invalid", b'x '],
-        ["invalid", b'G:x'],
-        ["invalid", b' S:"; f 9xx10 00 24 29 55 ."Vw  -O Pjv 7  = &"x[ x!mx"'],
-        ["invalid", b' G: ": xh >xWx"S  \\\\x& "'],
-        ["invalid", b' S:x = null'],
-        ["invalid", b'D: 3 49 4  82xxxx1  98 5 9 9'],
-        ["invalid", b'D: x? aA R:/" ) 3xx dx; 6x/ x79xxx.  0xx 831 41  5'],
-        ["invalid", b'S:1 0 1 37x2x 7x 9x null'],
-        ["invalid", b'D7 9  41 / x3 4 "  ( yx"'],
-        ["invalid", b' D:4 939 3 '],
-        ["invalid", b'x - 2 5 46x87 x 1 73  8 /" _xF ~ 6  C "'],
-        ["invalid", b'G" N |\\\\\'5x 940 9 9 482x4  71 xx0 26 '],
-        ["invalid", b'xx"  =xxx 84x2  699 '],
-        ["invalid", b':xxxW &x'],
-        ["invalid", b'S:={"",[]}'],
-    ])
-    def test_invalid(self, _name, expression):
+    def test_php_unserialize(self):
+        for serialized, expected in UNSERIALIZE_CASES:
+            with self.subTest(serialized=serialized):
+                self.assertEqual(_cached_unserialize(serialized), expected)
+
+    def test_idempotence(self):
+        for serialized in IDEMPOTENCE_CASES:
+            with self.subTest(serialized=serialized):
+                self.assertEqual(php_serialize(
+                    _cached_unserialize(serialized)), serialized)
+
+    def test_query(self):
+        # Query.run never mutates its structure in place, so consecutive rows
+        # sharing the same initial object can reuse a single Query. Rows are
+        # grouped by identity, equal but distinct values such as [(1, 1)] and
+        # [(True, 1)] must each run on their own structure.
+        for _, rows in groupby(QUERY_CASES, key=lambda row: id(row[0])):
+            query = Query(None)
+            for initial, expression, expected in rows:
+                with self.subTest(initial=initial, expression=expression):
+                    query.structure = initial
+                    self.assertEqual(query.run(expression), expected)
+
+    def test_php_modify(self):
+        for serialized, expression, expected in MODIFY_CASES:
+            with self.subTest(serialized=serialized, expression=expression):
+                self.assertEqual(php_modify(serialized, expression), expected)
+
+    def test_invalid_serialized(self):
+        for serialized in INVALID_SERIALIZED_CASES:
+            with self.subTest(serialized=serialized):
+                with self.assertRaises(ParseError):
+                    php_unserialize(serialized)
+
+    def test_invalid_value(self):
+        for value in INVALID_VALUE_CASES:
+            with self.subTest(value=value):
+                with self.assertRaises(SerializeError):
+                    php_serialize(value)
+
+    def test_read_until(self):
+        parser = Parser(b"12:34;")
+        self.assertEqual(parser.read_until(b":"), b"12")
+        self.assertEqual(parser.current, 2)
         with self.assertRaises(ParseError):
-            Query([]).run(expression)
+            parser.read_until(b"}")
+
+    def test_deep_nesting(self):
+        depth = 5000
+        path = b"/".join([b"0"] * depth)
+
+        serialized = b"a:1:{i:0;" * depth + b"i:1;" + b"}" * depth
+        self.assertEqual(Query(php_unserialize(serialized)).run(b"G:" + path), 1)
+
+        expression = b"S:=" + b"[0:" * depth + b"1" + b"]" * depth
+        self.assertEqual(Query(Query(_EMPTY_INITIAL).run(expression)).run(b"G:" + path), 1)
+
+    def test_invalid_command(self):
+        for expression in INVALID_COMMAND_CASES:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ParseError):
+                    Query(_EMPTY_INITIAL).run(expression)
+
+    def _assert_valid(self, expressions):
+        for expression in expressions:
+            with self.subTest(expression=expression):
+                try:
+                    Query(_EMPTY_INITIAL).run(expression)
+                except ParseError as e:
+                    self.fail(f'Error on {expression}: {e}')
+
+    def _assert_invalid(self, expressions):
+        for expression in expressions:
+            with self.subTest(expression=expression):
+                try:
+                    Query(_EMPTY_INITIAL).run(expression)
+                except ParseError:
+                    continue
+
+                self.fail(f'No error on {expression}')
+
+
+def _shard_test(check, expressions: tuple, shard: int):
+    """Build a test method running check on one shard of expressions."""
+    def test(self):
+        check(self, expressions[shard::SHARD_COUNT])
+
+    return test
+
+
+# The generated tables are split into independent shards so that a parallel
+# runner can spread them over several workers. The shard methods are built from
+# SHARD_COUNT so that every expression is always covered.
+for _shard in range(SHARD_COUNT):
+    setattr(
+        TestPHPSerializeEdit,
+        f"test_valid_shard_{_shard}",
+        _shard_test(TestPHPSerializeEdit._assert_valid, VALID_EXPRESSIONS, _shard),
+    )
+    setattr(
+        TestPHPSerializeEdit,
+        f"test_invalid_shard_{_shard}",
+        _shard_test(
+            TestPHPSerializeEdit._assert_invalid, INVALID_EXPRESSIONS, _shard
+        ),
+    )
 
 
 if __name__ == '__main__':